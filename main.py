@@ -5,15 +5,131 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import json
 import datetime
+import calendar
 import random
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import uuid
+import collections
+import functools
+import io
+import sys
+import argparse
+import cProfile
+import pstats
+import http.server
+import urllib.parse
+import csv
+import os
+import tempfile
+import itertools
+import concurrent.futures
+import asyncio
+import zlib
+import lzma
 
 # Constants
-MAX_NONCE = 100000000000
+MAX_NONCE = 100000000000  # nonces tried per extra nonce
+EXTRA_NONCE_LIMIT = 1 << 32
+MAX_TIMESTAMP_ROLL = 7200  # seconds a block timestamp may be rolled forward
+WORK_UNIT_SIZE = 1 << 20  # nonces per work unit
 REWARD_POINTS_PER_REFERRAL = 100
 REFERRAL_BONUS_PERCENTAGE = 0.1  # 10% bonus from referrals
+REFERRAL_HISTORY_LIMIT = 100  # referrals kept in memory; the full log stays on disk
+PROFILE_SAVE_DELAY = 0.5  # seconds of quiet before profile changes are written
+PROFILE_SAVE_MAX_DELAY = 2.0
+# Built once; widgets refer to these roles rather than to colors
+THEME_PALETTES = {
+    "light": {
+        "bg": "#f0f0f0",
+        "text": "#333333",
+        "header_bg": "#1E3D59",
+        "card_bg": "#ffffff",
+        "input_bg": "#ffffff",
+        "text_bg": "#f8f8f8"
+    },
+    "dark": {
+        "bg": "#1a1a1a",
+        "text": "#ffffff",
+        "header_bg": "#0d1a26",
+        "card_bg": "#2d2d2d",
+        "input_bg": "#333333",
+        "text_bg": "#2d2d2d"
+    }
+}
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+STATS_INTERVAL_MS = 1000
+PROFILE_NOTICE_MS = 3000  # how long the "saving" notice under the profile form stays
+PROGRESS_INTERVAL = 10000  # hashes between progress/metrics updates
+SWEEP_EPOCH_NS = 1700000000 * 1000000000  # block timestamps in sweep runs, so a seed reproduces them
+RECORDING_FORMAT = 1
+LATENCY_PROBE_MS = 100  # how often Tk event latency is sampled
+DEFAULT_LATENCY_TARGET = 0.05  # seconds
+SCHEDULER_MIN_BATCH = 100
+SCHEDULER_MAX_BATCH = 20000
+INGEST_CHUNK_SIZE = 5000  # records per worker task
+INGEST_CHUNKS_IN_FLIGHT = 2  # per worker, bounds read-ahead
+INGEST_BLOCK_SIZE = 4096  # characters of transactions per pending block
+INGEST_REPORT_INTERVAL = 5.0  # seconds
+HOST_BATCH_SIZE = 2000  # nonces a host session hashes per turn
+HOST_REPORT_INTERVAL = 5.0  # seconds
+SEGMENT_SIZE = 256  # pruned block bodies per segment file
+SEGMENT_CACHE_SIZE = 2  # segments kept decompressed in memory
+DEFAULT_SEGMENT_DIR = "chain_segments"
+SEGMENT_COMPRESSION = {
+    "zlib": (".zz", zlib.compress, zlib.decompress),
+    "lzma": (".xz", lzma.compress, lzma.decompress)
+}
+HASH_SAMPLE_INTERVAL = 64  # time one calculate_hash call out of every 64
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+EXPORT_CHUNK_SIZE = 10000
+EXPORT_COLUMNS = {
+    "blocks": ("block_number", "timestamp", "difficulty", "nonce", "extra_nonce", "hash",
+               "previous_hash", "transaction_count", "transactions"),
+    "transactions": ("block_number", "timestamp", "index", "sender", "recipient", "amount")
+}
+# Column name -> pyarrow type factory (pyarrow is optional, so resolved lazily)
+EXPORT_PARQUET_TYPES = {
+    "block_number": lambda pa: pa.int64(),
+    "timestamp": lambda pa: pa.string(),
+    "difficulty": lambda pa: pa.int32(),
+    "nonce": lambda pa: pa.int64(),
+    "extra_nonce": lambda pa: pa.int64(),
+    "hash": lambda pa: pa.string(),
+    "previous_hash": lambda pa: pa.string(),
+    "transaction_count": lambda pa: pa.int32(),
+    "transactions": lambda pa: pa.string(),
+    "index": lambda pa: pa.int32(),
+    "sender": lambda pa: pa.string(),
+    "recipient": lambda pa: pa.string(),
+    "amount": lambda pa: pa.float64()
+}
+
+class SystemClock:
+    def time_ns(self):
+        return time.time_ns()
+
+    def monotonic(self):
+        return time.perf_counter()
+
+class VirtualClock:
+    # Only moves when told to, so block timestamps are reproducible
+    def __init__(self, now_ns=0):
+        self.now_ns = now_ns
+
+    def time_ns(self):
+        return self.now_ns
+
+    def monotonic(self):
+        return self.now_ns / 1e9
+
+    def set(self, now_ns):
+        self.now_ns = now_ns
+
+    def advance(self, seconds):
+        self.now_ns += int(seconds * 1e9)
+
+SYSTEM_CLOCK = SystemClock()
 
 class UserProfile:
     def __init__(self):
@@ -25,7 +141,7 @@ class UserProfile:
         self.referral_code = str(uuid.uuid4())[:8]
         self.referral_points = 0
         self.total_referrals = 0
-        self.referral_history = []
+        self.referral_history = collections.deque(maxlen=REFERRAL_HISTORY_LIMIT)
         self.theme = "light"  # Default theme
 
     def to_json(self):
@@ -38,7 +154,6 @@ class UserProfile:
             "referral_code": self.referral_code,
             "referral_points": self.referral_points,
             "total_referrals": self.total_referrals,
-            "referral_history": self.referral_history,
             "theme": self.theme
         }
 
@@ -51,19 +166,219 @@ class UserProfile:
         self.referral_code = data.get("referral_code", str(uuid.uuid4())[:8])
         self.referral_points = data.get("referral_points", 0)
         self.total_referrals = data.get("total_referrals", 0)
-        self.referral_history = data.get("referral_history", [])
+        self.referral_history = collections.deque(
+            data.get("referral_history", []), maxlen=REFERRAL_HISTORY_LIMIT)
         self.theme = data.get("theme", "light")
 
+class ProfileStore:
+    # Persists a UserProfile from a background thread. Changes made in quick
+    # succession are combined into one atomic rewrite of profile.json, and
+    # referrals go to an append-only log instead of being rewritten each time.
+    def __init__(self, profile, filename="profile.json", history_filename="referrals.log",
+                 delay=PROFILE_SAVE_DELAY, on_error=None):
+        self.profile = profile
+        self.filename = filename
+        self.history_filename = history_filename
+        self.delay = delay
+        self.on_error = on_error
+        self.condition = threading.Condition()
+        self.snapshot = None
+        self.pending_referrals = []
+        self.changed_at = None
+        self.first_change_at = None
+        self.writing = False
+        self.flush_requested = False
+        self.closed = False
+        self.thread = None
+
+    def load(self):
+        try:
+            with open(self.filename, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            # Use default profile if file doesn't exist
+            data = None
+        if data is not None:
+            self.profile.from_json(data)
+            if "referral_history" in data:
+                # Move history out of profile.json the first time we see it,
+                # then drop it from the profile file
+                if data["referral_history"] and not os.path.exists(self.history_filename):
+                    self.write_referrals(data["referral_history"])
+                self.write_profile(self.profile.to_json())
+        
+        # The log is the only source of history; only the most recent
+        # referrals are kept in memory
+        self.profile.referral_history.clear()
+        try:
+            with open(self.history_filename, "r") as f:
+                for line in f:
+                    if line.strip():
+                        self.profile.referral_history.append(json.loads(line))
+        except FileNotFoundError:
+            pass
+
+    def schedule_save(self):
+        snapshot = self.profile.to_json()
+        with self.condition:
+            self.snapshot = snapshot
+            self.mark_changed()
+
+    def append_referral(self, referral):
+        with self.condition:
+            self.pending_referrals.append(referral)
+            self.mark_changed()
+
+    def mark_changed(self):
+        now = time.monotonic()
+        if self.first_change_at is None:
+            self.first_change_at = now
+        self.changed_at = now
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="profile-store", daemon=True)
+            self.thread.start()
+        self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        # Blocks until everything scheduled so far is on disk
+        with self.condition:
+            self.flush_requested = True
+            self.condition.notify_all()
+            done = self.condition.wait_for(
+                lambda: self.changed_at is None and not self.writing, timeout)
+            self.flush_requested = False
+        return done
+
+    def close(self):
+        self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                # Wait for a quiet period, but never hold changes back for too long
+                while not self.closed:
+                    if self.changed_at is None:
+                        self.condition.wait()
+                        continue
+                    now = time.monotonic()
+                    due = min(self.changed_at + self.delay, self.first_change_at + PROFILE_SAVE_MAX_DELAY)
+                    if now >= due or self.flush_requested:
+                        break
+                    self.condition.wait(due - now)
+                if self.closed and self.changed_at is None:
+                    return
+                snapshot, self.snapshot = self.snapshot, None
+                referrals, self.pending_referrals = self.pending_referrals, []
+                self.changed_at = self.first_change_at = None
+                self.writing = True
+            
+            try:
+                start = time.perf_counter()
+                if referrals:
+                    self.write_referrals(referrals)
+                if snapshot is not None:
+                    self.write_profile(snapshot)
+                PERSISTENCE_WRITE_SECONDS.observe(time.perf_counter() - start, target="profile")
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def write_profile(self, snapshot):
+        # Write to a temp file in the same directory, then atomically replace
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, temp_path = tempfile.mkstemp(prefix=".profile-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.filename)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def write_referrals(self, referrals):
+        with open(self.history_filename, "a") as f:
+            for referral in referrals:
+                f.write(json.dumps(referral) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+def format_timestamp(timestamp_ns):
+    # UTC, so the text is the same on every machine and parse_timestamp is
+    # an exact inverse (local time has DST gaps and repeated hours)
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(timestamp_ns // 1000000000))
+
+def parse_timestamp(text):
+    return calendar.timegm(time.strptime(text, TIMESTAMP_FORMAT)) * 1000000000
+
+def extra_nonce_text(extra_nonce):
+    # Extra nonce 0 adds nothing, so blocks without one hash as before. It
+    # goes after the fixed-length previous hash and is delimited on both
+    # sides, so neither the transactions nor the nonce can imitate it.
+    return f":{extra_nonce}:" if extra_nonce else ""
+
 class Block:
-    def __init__(self, block_number, transactions, previous_hash, difficulty):
+    # Blocks are kept for the whole session, so store them compactly: no
+    # per-instance __dict__, an integer nanosecond timestamp and raw 32-byte
+    # hashes. Hex and date strings are only produced when displayed/saved.
+    __slots__ = (
+        "block_number",
+        "transactions",
+        "difficulty",
+        "nonce",
+        "extra_nonce",
+        "timestamp_ns",
+        "hash_bytes",
+        "previous_hash_bytes",
+    )
+
+    def __init__(self, block_number, transactions, previous_hash, difficulty, timestamp_ns=None):
         self.block_number = block_number
         self.transactions = transactions
         self.previous_hash = previous_hash
         self.difficulty = difficulty
         self.nonce = 0
-        self.timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.hash = None
-    
+        self.extra_nonce = 0
+        self.timestamp_ns = time.time_ns() if timestamp_ns is None else timestamp_ns
+        self.hash_bytes = None
+
+    @property
+    def timestamp(self):
+        # Second resolution text, as used by the hash and the explorer. It is
+        # formatted on every use rather than kept on the block.
+        return format_timestamp(self.timestamp_ns)
+
+    @timestamp.setter
+    def timestamp(self, value):
+        # Legacy blocks carry a formatted string (local time where they were
+        # mined). It is read as UTC, which formats back to exactly the same
+        # text, so the recomputed hash matches what was originally mined.
+        self.timestamp_ns = parse_timestamp(value)
+
+    @property
+    def hash(self):
+        return None if self.hash_bytes is None else self.hash_bytes.hex()
+
+    @hash.setter
+    def hash(self, value):
+        self.hash_bytes = None if value is None else bytes.fromhex(value)
+
+    @property
+    def previous_hash(self):
+        return self.previous_hash_bytes.hex()
+
+    @previous_hash.setter
+    def previous_hash(self, value):
+        self.previous_hash_bytes = value if isinstance(value, bytes) else bytes.fromhex(value)
+
     def to_json(self):
         return {
             "block_number": self.block_number,
@@ -71,37 +386,95 @@ class Block:
             "previous_hash": self.previous_hash,
             "difficulty": self.difficulty,
             "nonce": self.nonce,
+            "extra_nonce": self.extra_nonce,
             "timestamp": self.timestamp,
             "hash": self.hash
         }
 
+    @classmethod
+    def from_json(cls, data):
+        block = cls(
+            data["block_number"],
+            data["transactions"],
+            data["previous_hash"],
+            data["difficulty"]
+        )
+        block.hash = data["hash"]
+        block.nonce = data["nonce"]
+        block.extra_nonce = data.get("extra_nonce", 0)
+        block.timestamp = data["timestamp"]
+        return block
+
 class Blockchain:
-    def __init__(self):
+    # With prune_depth set, only the newest prune_depth blocks keep their
+    # transaction bodies in memory. Older bodies are written SEGMENT_SIZE at
+    # a time to compressed segment files and reloaded on demand.
+    def __init__(self, prune_depth=None, segment_dir=DEFAULT_SEGMENT_DIR, compression="zlib", clock=None):
+        if prune_depth is not None and prune_depth < 1:
+            # The newest block must keep its body; it is what gets mined on
+            raise ValueError("prune_depth must be at least 1")
         self.chain = []
+        self.clock = clock or SYSTEM_CLOCK
+        self.prune_depth = prune_depth
+        self.segment_dir = segment_dir
+        self.compression = compression
+        self.pruned_height = 0  # blocks below this height have no body in memory
+        self.segment_cache = collections.OrderedDict()
         # Genesis block
-        genesis_block = Block(0, "Genesis Block", "0"*64, 1)
+        genesis_block = Block(0, "Genesis Block", bytes(32), 1, self.clock.time_ns())
         genesis_block.hash = self.calculate_hash(genesis_block, 0)
         genesis_block.nonce = 0
         self.chain.append(genesis_block)
         
     def calculate_hash(self, block, nonce):
+        return self.nonce_hasher(block)(nonce)
+    
+    def hash_template(self, block, extra_nonce=None, timestamp_ns=None):
+        # The hashed text for a nonce is prefix + str(nonce) + suffix
+        transactions = block.transactions
+        if transactions is None:
+            transactions = self.get_transactions(block)
+        if extra_nonce is None:
+            extra_nonce = block.extra_nonce
+        if timestamp_ns is None:
+            timestamp_ns = block.timestamp_ns
+        timestamp = format_timestamp(timestamp_ns)
         text = (str(block.block_number) + 
-                block.transactions + 
+                transactions + 
                 block.previous_hash + 
-                str(nonce) + 
-                block.timestamp)
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+                extra_nonce_text(extra_nonce))
+        return text.encode("utf-8"), timestamp.encode("utf-8")
+
+    def nonce_hasher(self, block, extra_nonce=None, timestamp_ns=None):
+        # Returns a function nonce -> hash for the block template. Everything
+        # before the nonce is hashed once here, so each call costs the same
+        # however large the transactions are.
+        prefix, suffix = self.hash_template(block, extra_nonce, timestamp_ns)
+        midstate = hashlib.sha256(prefix)
+        
+        def hash_nonce(nonce):
+            sha = midstate.copy()
+            sha.update(b"%d%s" % (nonce, suffix))
+            return sha.hexdigest()
+        return hash_nonce
     
     def add_block(self, transactions, difficulty):
         block_number = len(self.chain)
-        previous_hash = self.chain[-1].hash
-        new_block = Block(block_number, transactions, previous_hash, difficulty)
+        # Share the previous block's hash bytes rather than copying them
+        previous_hash = self.chain[-1].hash_bytes
+        new_block = Block(block_number, transactions, previous_hash, difficulty, self.clock.time_ns())
         return new_block
     
+    def append_block(self, block):
+        self.chain.append(block)
+        if self.prune_depth is not None:
+            self.prune()
+    
     def get_latest_block(self):
         return self.chain[-1]
     
     def is_chain_valid(self):
+        # Pruned bodies are read back one segment at a time
         for i in range(1, len(self.chain)):
             current = self.chain[i]
             previous = self.chain[i-1]
@@ -111,25 +484,1287 @@ class Blockchain:
                 return False
                 
             # Check link to previous block
-            if current.previous_hash != previous.hash:
+            if current.previous_hash_bytes != previous.hash_bytes:
                 return False
         
         return True
     
+    def prune(self):
+        while len(self.chain) - self.prune_depth - self.pruned_height >= SEGMENT_SIZE:
+            start = self.pruned_height
+            blocks = self.chain[start:start + SEGMENT_SIZE]
+            self.write_segment(start, [block.transactions for block in blocks])
+            for block in blocks:
+                block.transactions = None
+            self.pruned_height += SEGMENT_SIZE
+    
+    def get_transactions(self, block):
+        if block.transactions is not None:
+            return block.transactions
+        start = block.block_number - block.block_number % SEGMENT_SIZE
+        return self.load_segment(start)[block.block_number - start]
+    
+    def segment_path(self, start):
+        # Named after the hash of the segment's last block, which commits to
+        # every block before it. Chains sharing a directory therefore only
+        # share a segment file when they agree on its whole prefix.
+        extension = SEGMENT_COMPRESSION[self.compression][0]
+        last_hash = self.chain[start + SEGMENT_SIZE - 1].hash
+        return os.path.join(self.segment_dir, f"segment-{start:010d}-{last_hash[:16]}{extension}")
+    
+    def write_segment(self, start, bodies):
+        os.makedirs(self.segment_dir, exist_ok=True)
+        compress = SEGMENT_COMPRESSION[self.compression][1]
+        path = self.segment_path(start)
+        if os.path.exists(path):
+            # Same prefix, so the same bodies; another chain already wrote it
+            return
+        with open(path + ".tmp", "wb") as f:
+            f.write(compress(json.dumps(bodies).encode("utf-8")))
+        os.replace(path + ".tmp", path)
+    
+    def load_segment(self, start):
+        bodies = self.segment_cache.get(start)
+        if bodies is not None:
+            self.segment_cache.move_to_end(start)
+            return bodies
+        decompress = SEGMENT_COMPRESSION[self.compression][2]
+        with open(self.segment_path(start), "rb") as f:
+            bodies = json.loads(decompress(f.read()).decode("utf-8"))
+        self.segment_cache[start] = bodies
+        if len(self.segment_cache) > SEGMENT_CACHE_SIZE:
+            self.segment_cache.popitem(last=False)
+        return bodies
+    
+    def iter_blocks_json(self):
+        # Full block dicts, pruned bodies included, without loading them all
+        for block in self.chain:
+            data = block.to_json()
+            if data["transactions"] is None:
+                data["transactions"] = self.get_transactions(block)
+            yield data
+    
     def to_json(self):
-        return [block.to_json() for block in self.chain]
+        return list(self.iter_blocks_json())
+    
+    def snapshot(self, filename):
+        # Compacted chain state: a metadata line, then one line per block.
+        # Pruned blocks are stored as headers; their bodies stay in segments.
+        metadata = {
+            "prune_depth": self.prune_depth,
+            "segment_dir": self.segment_dir,
+            "compression": self.compression,
+            "segment_size": SEGMENT_SIZE,
+            "pruned_height": self.pruned_height
+        }
+        with lzma.open(filename + ".tmp", "wt", encoding="utf-8") as f:
+            f.write(json.dumps(metadata) + "\n")
+            for block in self.chain:
+                f.write(json.dumps(block.to_json()) + "\n")
+        os.replace(filename + ".tmp", filename)
+    
+    @classmethod
+    def load_snapshot(cls, filename):
+        with lzma.open(filename, "rt", encoding="utf-8") as f:
+            metadata = json.loads(f.readline())
+            if metadata["segment_size"] != SEGMENT_SIZE:
+                raise ValueError(f"Snapshot uses segments of {metadata['segment_size']} blocks")
+            blockchain = cls(metadata["prune_depth"], metadata["segment_dir"], metadata["compression"])
+            blockchain.chain = [Block.from_json(json.loads(line)) for line in f if line.strip()]
+        blockchain.pruned_height = metadata["pruned_height"]
+        return blockchain
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+    kind = "counter"
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.values = {}  # label key -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, state in self.values.items():
+                for bound, count in zip(self.buckets, state):
+                    samples.append((self.name + "_bucket", key + (repr(float(bound)),), count))
+                samples.append((self.name + "_bucket", key + ("+Inf",), state[-1]))
+                samples.append((self.name + "_sum", key, state[-2]))
+                samples.append((self.name + "_count", key, state[-1]))
+        return samples
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        # Prometheus text exposition format, version 0.0.4
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            labelnames = metric.labelnames
+            for sample_name, key, value in metric.samples():
+                names = labelnames + ("le",) if len(key) > len(labelnames) else labelnames
+                if names:
+                    label_text = ",".join(
+                        f'{name}="{escape_label_value(label)}"' for name, label in zip(names, key))
+                    lines.append(f"{sample_name}{{{label_text}}} {value}")
+                else:
+                    lines.append(f"{sample_name} {value}")
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
+HASHES_TOTAL = METRICS.counter(
+    "miner_hashes_total", "Hashes computed by each mining worker", ("worker",))
+HASHRATE = METRICS.gauge(
+    "miner_hashrate", "Most recent hashes per second of each mining worker", ("worker",))
+HASH_SECONDS = METRICS.counter(
+    "miner_hash_seconds_total", "Estimated time spent inside calculate_hash", ("worker",))
+LOOP_SECONDS = METRICS.counter(
+    "miner_loop_seconds_total", "Wall time spent in the nonce loop, hashing included", ("worker",))
+BLOCKS_MINED = METRICS.counter(
+    "miner_blocks_total", "Blocks found by this process")
+UI_CALLBACK_SECONDS = METRICS.histogram(
+    "ui_callback_seconds", "Time spent in Tk callbacks", ("callback",))
+TK_EVENT_LAG_SECONDS = METRICS.histogram(
+    "tk_event_lag_seconds", "Delay between a scheduled Tk timer and its execution")
+SCHEDULER_BATCH_SIZE = METRICS.gauge(
+    "miner_scheduler_batch_size", "Hashes the mining thread runs between yields to the UI")
+PERSISTENCE_WRITE_SECONDS = METRICS.histogram(
+    "persistence_write_seconds", "Time spent writing state to disk", ("target",))
+
+def timed_callback(name):
+    # Records how long a Tk callback holds the event loop
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                UI_CALLBACK_SECONDS.observe(time.perf_counter() - start, callback=name)
+        return wrapper
+    return decorator
+
+class HotPathProfiler:
+    # Two optional profilers that can be toggled while the app runs:
+    # a sampling profiler that walks every thread's stack, and cProfile,
+    # which is enabled inside each mining thread as it starts.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sampling_thread = None
+        self.sampling = False
+        self.samples = collections.Counter()
+        self.cprofile_enabled = False
+        self.cprofile_stats = None
+
+    def start_sampling(self, interval=0.005):
+        with self.lock:
+            if self.sampling:
+                return False
+            self.sampling = True
+            self.samples = collections.Counter()
+        self.sampling_thread = threading.Thread(
+            target=self._sample_loop, args=(interval,), name="sampling-profiler", daemon=True)
+        self.sampling_thread.start()
+        return True
+
+    def stop_sampling(self):
+        with self.lock:
+            self.sampling = False
+        if self.sampling_thread is not None:
+            self.sampling_thread.join()
+            self.sampling_thread = None
+        # Collapsed stacks, ready for flamegraph.pl / speedscope
+        return "\n".join(
+            f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def _sample_loop(self, interval):
+        own_id = threading.get_ident()
+        while self.sampling:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+
+    def start_cprofile(self):
+        with self.lock:
+            self.cprofile_enabled = True
+            self.cprofile_stats = None
+
+    def stop_cprofile(self, limit=40):
+        with self.lock:
+            self.cprofile_enabled = False
+            stats = self.cprofile_stats
+            self.cprofile_stats = None
+        if stats is None:
+            return "No mining thread ran while cProfile was enabled\n"
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+    def profile_thread(self, func, *args):
+        # Runs func under cProfile when enabled and merges the result
+        if not self.cprofile_enabled:
+            return func(*args)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            with self.lock:
+                if self.cprofile_stats is None:
+                    self.cprofile_stats = pstats.Stats(profile)
+                else:
+                    self.cprofile_stats.add(profile)
+
+PROFILER = HotPathProfiler()
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if url.path == "/metrics":
+            self.send_text(METRICS.render(), "text/plain; version=0.0.4")
+        elif url.path == "/profile/sampling/start":
+            try:
+                interval = float(query.get("interval", ["0.005"])[0])
+            except ValueError:
+                interval = None
+            if interval is None or not 0 < interval < float("inf"):
+                self.send_error(400, "interval must be a positive number of seconds")
+                return
+            started = PROFILER.start_sampling(interval)
+            self.send_text("started\n" if started else "already running\n")
+        elif url.path == "/profile/sampling/stop":
+            self.send_text(PROFILER.stop_sampling())
+        elif url.path == "/profile/cprofile/start":
+            PROFILER.start_cprofile()
+            self.send_text("cProfile enabled for new mining threads\n")
+        elif url.path == "/profile/cprofile/stop":
+            self.send_text(PROFILER.stop_cprofile())
+        else:
+            self.send_error(404)
+
+    def send_text(self, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep scrapes out of the console
+        pass
+
+def start_metrics_server(port, host="127.0.0.1"):
+    server = http.server.ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
+
+class SearchSpaceExhausted(RuntimeError):
+    pass
+
+WorkUnit = collections.namedtuple("WorkUnit", ["extra_nonce", "timestamp_ns", "nonces"])
+
+class SearchSpace:
+    # Hands out non-overlapping work units for one block template, safe to
+    # share between workers. Each extra-nonce value has its own nonce space;
+    # when all extra nonces are used up the timestamp is rolled forward one
+    # second (up to max_timestamp_roll seconds) and the extra nonce restarts.
+    def __init__(self, block, unit_size=WORK_UNIT_SIZE, nonce_limit=MAX_NONCE,
+                 extra_nonce_limit=EXTRA_NONCE_LIMIT, max_timestamp_roll=MAX_TIMESTAMP_ROLL):
+        self.lock = threading.Lock()
+        self.unit_size = unit_size
+        self.nonce_limit = nonce_limit
+        self.extra_nonce_limit = extra_nonce_limit
+        self.max_timestamp_roll = max_timestamp_roll
+        self.start_timestamp_ns = block.timestamp_ns
+        self.start_extra_nonce = block.extra_nonce
+        self.last_timestamp_ns = block.timestamp_ns + max_timestamp_roll * 1000000000
+        self.timestamp_ns = block.timestamp_ns
+        self.extra_nonce = block.extra_nonce
+        self.next_nonce = 0
+
+    def next_unit(self):
+        with self.lock:
+            if self.next_nonce >= self.nonce_limit:
+                self.next_nonce = 0
+                self.extra_nonce += 1
+                if self.extra_nonce >= self.extra_nonce_limit:
+                    self.extra_nonce = 0
+                    self.timestamp_ns += 1000000000
+                    if self.timestamp_ns > self.last_timestamp_ns:
+                        raise SearchSpaceExhausted("No nonce, extra nonce or timestamp left to try")
+            start = self.next_nonce
+            self.next_nonce = min(start + self.unit_size, self.nonce_limit)
+            return WorkUnit(self.extra_nonce, self.timestamp_ns, range(start, self.next_nonce))
+
+    def to_json(self):
+        # Everything needed to hand out the same sequence of units again
+        return {
+            "timestamp_ns": self.start_timestamp_ns,
+            "timestamp": format_timestamp(self.start_timestamp_ns),
+            "extra_nonce": self.start_extra_nonce,
+            "unit_size": self.unit_size,
+            "nonce_limit": self.nonce_limit,
+            "extra_nonce_limit": self.extra_nonce_limit,
+            "max_timestamp_roll": self.max_timestamp_roll
+        }
+
+    def seal(self, block, unit, nonce, hash_result):
+        # Writes the winning unit's fields into the block template
+        block.extra_nonce = unit.extra_nonce
+        if unit.timestamp_ns != block.timestamp_ns:
+            block.timestamp_ns = unit.timestamp_ns
+        block.nonce = nonce
+        block.hash = hash_result
+
+def mine_search_space(blockchain, block, difficulty, space, is_running=None, on_progress=None, scheduler=None):
+    # Searches work units from space until a hash qualifies. Returns
+    # (unit, nonce, hash), or None once is_running turns false.
+    while is_running is None or is_running():
+        unit = space.next_unit()
+        hash_nonce = blockchain.nonce_hasher(block, unit.extra_nonce, unit.timestamp_ns)
+        result = search_nonce(
+            blockchain, block, difficulty, unit.nonces, is_running, on_progress, scheduler, hash_nonce)
+        if result is not None:
+            return (unit,) + result
+    return None
+
+def record_mining_batch(worker, hashes, batch_start, sampled_hash_ns):
+    if hashes == 0:
+        return
+    HASHES_TOTAL.inc(hashes, worker=worker)
+    LOOP_SECONDS.inc(time.perf_counter() - batch_start, worker=worker)
+    # Only every HASH_SAMPLE_INTERVAL-th hash was timed
+    samples = (hashes + HASH_SAMPLE_INTERVAL - 1) // HASH_SAMPLE_INTERVAL
+    HASH_SECONDS.inc(sampled_hash_ns / 1e9 * hashes / samples, worker=worker)
+
+def search_nonce(blockchain, block, difficulty, nonces, is_running=None, on_progress=None, scheduler=None,
+                 hash_nonce=None):
+    # The nonce loop shared by the GUI and headless runs. Returns
+    # (nonce, hash) for the first qualifying nonce, or None when stopped or
+    # when the nonces run out. on_progress receives hash counts in batches;
+    # an optional MiningScheduler paces the loop.
+    prefix_str = '0' * difficulty
+    if hash_nonce is None:
+        hash_nonce = blockchain.nonce_hasher(block)
+    until_pace = scheduler.start() if scheduler is not None else -1
+    
+    # Metrics are flushed once per batch to keep the loop cheap
+    worker = threading.current_thread().name
+    batch_hashes = 0
+    batch_start = time.perf_counter()
+    sampled_hash_ns = 0
+    
+    for nonce in nonces:
+        if is_running is not None and not is_running():
+            break
+        
+        # Calculate hash, timing a sample of calls
+        if batch_hashes % HASH_SAMPLE_INTERVAL == 0:
+            hash_start = time.perf_counter_ns()
+            hash_result = hash_nonce(nonce)
+            sampled_hash_ns += time.perf_counter_ns() - hash_start
+        else:
+            hash_result = hash_nonce(nonce)
+        batch_hashes += 1
+        
+        until_pace -= 1
+        if until_pace == 0:
+            until_pace = scheduler.pace()
+        
+        # Check if hash matches difficulty
+        if hash_result.startswith(prefix_str):
+            record_mining_batch(worker, batch_hashes, batch_start, sampled_hash_ns)
+            if on_progress is not None:
+                on_progress(batch_hashes)
+            return nonce, hash_result
+        
+        if batch_hashes == PROGRESS_INTERVAL:
+            record_mining_batch(worker, batch_hashes, batch_start, sampled_hash_ns)
+            if on_progress is not None:
+                on_progress(batch_hashes)
+            batch_hashes = 0
+            batch_start = time.perf_counter()
+            sampled_hash_ns = 0
+    
+    record_mining_batch(worker, batch_hashes, batch_start, sampled_hash_ns)
+    if on_progress is not None and batch_hashes:
+        on_progress(batch_hashes)
+    return None
+
+class MiningScheduler:
+    # Paces a mining thread: it hashes in batches and sleeps between them
+    # long enough to hold its duty cycle (the share of one core it may use).
+    # The batch size adapts to the Tk event latency reported by the UI, so
+    # the main loop gets the GIL back often enough to stay responsive.
+    def __init__(self, duty_cycle=1.0, latency_target=DEFAULT_LATENCY_TARGET, batch_size=SCHEDULER_MAX_BATCH):
+        if not 0 < duty_cycle <= 1:
+            raise ValueError("duty_cycle must be in (0, 1]")
+        self.duty_cycle = duty_cycle
+        self.latency_target = latency_target
+        self.batch_size = batch_size
+        self.batch_started = time.perf_counter()
+
+    def start(self):
+        self.batch_started = time.perf_counter()
+        return self.batch_size
+
+    def pace(self):
+        # Called by the mining thread after each batch; returns the next size
+        busy = time.perf_counter() - self.batch_started
+        # sleep(0) still releases the GIL at full duty cycle
+        time.sleep(busy * (1 - self.duty_cycle) / self.duty_cycle)
+        self.batch_started = time.perf_counter()
+        return self.batch_size
+
+    def report_latency(self, latency):
+        # Called from the Tk thread: back off quickly, recover slowly
+        if latency > self.latency_target:
+            self.batch_size = max(SCHEDULER_MIN_BATCH, self.batch_size // 2)
+        elif latency < self.latency_target / 2:
+            self.batch_size = min(SCHEDULER_MAX_BATCH, self.batch_size + self.batch_size // 4 + 1)
+        SCHEDULER_BATCH_SIZE.set(self.batch_size)
+
+def budget_workers(cpu_budget, cpu_count=None):
+    # Worker processes that fit in cpu_budget percent of the machine's cores
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(1, int(cpu_count * cpu_budget / 100))
+
+def configure_worker_process(cpus=None, niceness=0):
+    # ProcessPoolExecutor initializer: pin workers to cpus and lower their priority
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    if niceness and hasattr(os, "nice"):
+        os.nice(niceness)
+
+def parse_cpu_list(text):
+    # "0-3,6" -> {0, 1, 2, 3, 6}
+    cpus = set()
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+def write_blockchain_json(blocks, f):
+    # Same layout as json.dump(..., indent=4) on the whole chain, written
+    # one block dict at a time so no full copy of the chain is built
+    f.write("[")
+    first = True
+    for block in blocks:
+        f.write("\n    " if first else ",\n    ")
+        f.write(json.dumps(block, indent=4).replace("\n", "\n    "))
+        first = False
+    f.write("]" if first else "\n]")
+
+def iter_blockchain_file(filename, read_size=1 << 16):
+    # Incrementally decodes the JSON array written by save_blockchain,
+    # yielding one block dict at a time
+    decoder = json.JSONDecoder()
+    with open(filename, "r") as f:
+        buffer = ""
+        position = 0
+        started = False
+        eof = False
+        while True:
+            # Skip whitespace and array punctuation
+            while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+                if buffer[position] == "[":
+                    started = True
+                position += 1
+            if position < len(buffer) and started:
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield item
+                    position = end
+                    continue
+            elif position < len(buffer):
+                raise ValueError(f"{filename} is not a JSON array of blocks")
+            if eof:
+                return
+            chunk = f.read(read_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+def validate_transaction(sender, recipient, amount):
+    # Returns the "sender->recipient->amount" line, or raises ValueError
+    # with a message suitable for the user
+    if not sender or not recipient or not amount:
+        raise ValueError("Please fill in all fields")
+    try:
+        float(amount)
+    except ValueError:
+        raise ValueError("Amount must be a number")
+    if any("->" in field or "\n" in field for field in (sender, recipient, amount)):
+        raise ValueError("Fields cannot contain '->' or line breaks")
+    return f"{sender}->{recipient}->{amount}\n"
+
+def parse_transactions(text):
+    # Transactions are stored as "sender->recipient->amount" lines;
+    # other lines (e.g. the reward timestamp) are skipped
+    for line in text.splitlines():
+        parts = line.split("->")
+        if len(parts) != 3:
+            continue
+        sender, recipient, amount = (part.strip() for part in parts)
+        try:
+            amount_float = float(amount.split()[0]) if amount else None
+        except ValueError:
+            amount_float = None
+        yield sender, recipient, amount_float
+
+def iter_export_rows(blocks, kind="blocks", start=None, end=None):
+    # blocks are block dicts, e.g. from iter_blockchain_file or
+    # Blockchain.iter_blocks_json (which fills in pruned bodies)
+    for data in blocks:
+        height = data["block_number"]
+        if start is not None and height < start:
+            continue
+        if end is not None and height > end:
+            break
+        if kind == "blocks":
+            yield {
+                "block_number": height,
+                "timestamp": data["timestamp"],
+                "difficulty": data["difficulty"],
+                "nonce": data["nonce"],
+                "extra_nonce": data.get("extra_nonce", 0),
+                "hash": data["hash"],
+                "previous_hash": data["previous_hash"],
+                "transaction_count": sum(1 for _ in parse_transactions(data["transactions"])),
+                "transactions": data["transactions"]
+            }
+        else:
+            for index, (sender, recipient, amount) in enumerate(parse_transactions(data["transactions"])):
+                yield {
+                    "block_number": height,
+                    "timestamp": data["timestamp"],
+                    "index": index,
+                    "sender": sender,
+                    "recipient": recipient,
+                    "amount": amount
+                }
+
+def iter_chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def export_chain(blocks, filename, fmt="csv", kind="blocks", columns=None, start=None, end=None,
+                 chunk_size=EXPORT_CHUNK_SIZE):
+    if kind not in EXPORT_COLUMNS:
+        raise ValueError(f"Unknown export kind: {kind}")
+    columns = list(columns or EXPORT_COLUMNS[kind])
+    unknown = [column for column in columns if column not in EXPORT_COLUMNS[kind]]
+    if unknown:
+        raise ValueError(f"Unknown {kind} columns: {', '.join(unknown)}")
+    
+    rows = iter_export_rows(blocks, kind, start, end)
+    written = 0
+    if fmt == "csv":
+        with open(filename, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            for chunk in iter_chunks(rows, chunk_size):
+                writer.writerows(chunk)
+                written += len(chunk)
+    elif fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+        schema = pa.schema([(column, EXPORT_PARQUET_TYPES[column](pa)) for column in columns])
+        with pq.ParquetWriter(filename, schema) as writer:
+            # One row group per chunk
+            for chunk in iter_chunks(rows, chunk_size):
+                table = pa.Table.from_pydict(
+                    {column: [row[column] for row in chunk] for column in columns}, schema=schema)
+                writer.write_table(table)
+                written += len(chunk)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return written
+
+def run_export(args):
+    blocks = iter_blockchain_file(args.input)
+    columns = args.columns.split(",") if args.columns else None
+    start = time.perf_counter()
+    written = export_chain(
+        blocks, args.output, args.format, args.kind, columns, args.start, args.end, args.chunk_size)
+    print(f"Exported {written} {args.kind} rows to {args.output} in {time.perf_counter() - start:.2f}s")
+
+def random_transactions(rng, size):
+    # Payload of "sender->recipient->amount" lines, at least size characters
+    lines = []
+    length = 0
+    while length < size:
+        line = f"User{rng.randrange(1000)}->User{rng.randrange(1000)}->{rng.uniform(0.01, 100):.2f}\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines)
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def mine_headless(blockchain, block, difficulty, workers=1):
+    # Mines one block with `workers` threads sharing a SearchSpace, seals
+    # the block and returns the number of hashes computed
+    space = SearchSpace(block)
+    if workers == 1:
+        hashes = [0]
+        def count(batch):
+            hashes[0] += batch
+        unit, nonce, hash_result = mine_search_space(blockchain, block, difficulty, space, on_progress=count)
+        space.seal(block, unit, nonce, hash_result)
+        return hashes[0]
+    
+    found = threading.Event()
+    results = []
+    errors = []
+    hashes = [0] * workers
+    lock = threading.Lock()
+    
+    def work(index):
+        def count(batch):
+            hashes[index] += batch
+        try:
+            result = mine_search_space(blockchain, block, difficulty, space, lambda: not found.is_set(), count)
+        except Exception as e:
+            # Raised again below if no worker found a hash
+            with lock:
+                errors.append(e)
+            found.set()
+            return
+        if result is not None:
+            with lock:
+                results.append(result)
+            found.set()
+    
+    threads = [threading.Thread(target=work, args=(index,), name=f"worker-{index}") for index in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if not results:
+        raise errors[0]
+    # Earliest winning unit and nonce among the workers that found one
+    unit, nonce, hash_result = min(results, key=lambda result: (result[0].timestamp_ns, result[0].extra_nonce, result[1]))
+    space.seal(block, unit, nonce, hash_result)
+    return sum(hashes)
+
+def run_experiment(config):
+    # One sweep configuration, mined headless in a worker process
+    # A fixed clock keeps the timestamps, and so the nonce search, the same
+    # for every run of one config and seed (with one worker per run)
+    rng = random.Random(config["seed"])
+    blockchain = Blockchain(clock=VirtualClock(SWEEP_EPOCH_NS))
+    block_times = []
+    total_hashes = 0
+    run_start = time.perf_counter()
+    for _ in range(config["blocks"]):
+        transactions = random_transactions(rng, config["tx_size"])
+        block = blockchain.add_block(transactions, config["difficulty"])
+        block_start = time.perf_counter()
+        hashes = mine_headless(blockchain, block, config["difficulty"], config["workers"])
+        block_times.append(time.perf_counter() - block_start)
+        total_hashes += hashes
+        blockchain.append_block(block)
+    elapsed = time.perf_counter() - run_start
+    
+    block_times.sort()
+    result = dict(config)
+    result.update({
+        "block_time_mean": sum(block_times) / len(block_times) if block_times else None,
+        "block_time_p50": percentile(block_times, 50),
+        "block_time_p90": percentile(block_times, 90),
+        "block_time_p99": percentile(block_times, 99),
+        "block_time_max": block_times[-1] if block_times else None,
+        "hashes": total_hashes,
+        "hashrate": total_hashes / elapsed if elapsed > 0 else 0.0,
+        "elapsed": elapsed
+    })
+    return result
+
+def sweep_configs(difficulties, tx_sizes, workers, block_counts, seeds):
+    for difficulty, tx_size, worker_count, blocks, seed in itertools.product(
+            difficulties, tx_sizes, workers, block_counts, seeds):
+        yield {
+            "difficulty": difficulty,
+            "tx_size": tx_size,
+            "workers": worker_count,
+            "blocks": blocks,
+            "seed": seed
+        }
+
+def run_sweep(configs, output, jobs=None, cpus=None, niceness=0):
+    # Results are appended as NDJSON in completion order, one line per run
+    configs = list(configs)
+    completed = 0
+    pool = concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, initializer=configure_worker_process, initargs=(cpus, niceness))
+    with open(output, "a") as f, pool:
+        futures = {pool.submit(run_experiment, config): config for config in configs}
+        for future in concurrent.futures.as_completed(futures):
+            config = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = dict(config, error=str(e))
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            completed += 1
+            print(f"[{completed}/{len(configs)}] {json.dumps(config)}")
+    return completed
+
+def run_snapshot(args):
+    # Replays a saved chain into a pruned Blockchain and writes its snapshot
+    blockchain = Blockchain(args.prune_depth, args.segment_dir, args.compression)
+    blockchain.chain = []
+    for block_data in iter_blockchain_file(args.input):
+        blockchain.append_block(Block.from_json(block_data))
+    blockchain.snapshot(args.output)
+    print(f"Wrote snapshot of {len(blockchain.chain)} blocks "
+          f"({blockchain.pruned_height} pruned into {args.segment_dir}) to {args.output}")
+
+def run_sweep_command(args):
+    configs = sweep_configs(args.difficulty, args.tx_size, args.workers, args.blocks, args.seed)
+    cpus = parse_cpu_list(args.cpus) if args.cpus else None
+    jobs = args.jobs
+    if jobs is None:
+        jobs = budget_workers(args.cpu_budget, len(cpus) if cpus else None)
+    run_sweep(configs, args.output, jobs, cpus, args.nice)
+
+class SessionRecorder:
+    # Appends every mined block's inputs and outcome to an NDJSON file, so
+    # the same nonce searches can be re-run later with replay_session
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.file = open(filename, "a", buffering=1)
+
+    def write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+
+    def start_session(self, blockchain):
+        tip = blockchain.get_latest_block()
+        self.write({
+            "type": "session",
+            "format": RECORDING_FORMAT,
+            "base_block_number": tip.block_number,
+            "base_hash": tip.hash
+        })
+
+    def record_block(self, block, space, hashes):
+        self.write({
+            "type": "block",
+            "block_number": block.block_number,
+            "transactions": block.transactions,
+            "previous_hash": block.previous_hash,
+            "difficulty": block.difficulty,
+            "timestamp_ns": block.timestamp_ns,
+            "timestamp": block.timestamp,
+            "extra_nonce": block.extra_nonce,
+            "search": space.to_json(),
+            "nonce": block.nonce,
+            "hash": block.hash,
+            "hashes": hashes
+        })
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def iter_recording(filename):
+    with open(filename, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def replay_session(filename, blockchain=None):
+    # Re-runs every recorded nonce search headless under a virtual clock
+    # and checks that the same winning nonces and hashes come out
+    clock = VirtualClock()
+    blockchain = blockchain or Blockchain(clock=clock)
+    summary = {"sessions": 0, "blocks": 0, "mismatches": [], "hashes": 0, "seconds": 0.0}
+    previous_hash = None
+    for record in iter_recording(filename):
+        if record["type"] == "session":
+            if record["format"] != RECORDING_FORMAT:
+                raise ValueError(f"Unsupported recording format: {record['format']}")
+            summary["sessions"] += 1
+            previous_hash = record["base_hash"]
+            continue
+        
+        # Replay the whole search from the template the miner started with
+        search = record["search"]
+        clock.set(search["timestamp_ns"])
+        block = Block(
+            record["block_number"],
+            record["transactions"],
+            record["previous_hash"],
+            record["difficulty"],
+            clock.time_ns()
+        )
+        # The hashed text comes from timestamp_ns alone (in UTC), so a replay
+        # in another timezone hashes the same bytes
+        block.extra_nonce = search["extra_nonce"]
+        
+        hashes = [0]
+        def count(batch):
+            hashes[0] += batch
+        start = time.perf_counter()
+        space = SearchSpace(block, search["unit_size"], search["nonce_limit"],
+                            search["extra_nonce_limit"], search["max_timestamp_roll"])
+        try:
+            result = mine_search_space(blockchain, block, record["difficulty"], space, on_progress=count)
+        except SearchSpaceExhausted:
+            result = None
+        if result is not None:
+            unit, nonce, hash_result = result
+            result = (unit.extra_nonce, nonce, hash_result)
+        expected = (record["extra_nonce"], record["nonce"], record["hash"])
+        summary["seconds"] += time.perf_counter() - start
+        summary["hashes"] += hashes[0]
+        summary["blocks"] += 1
+        
+        if result != expected or hashes[0] != record["hashes"] or record["previous_hash"] != previous_hash:
+            summary["mismatches"].append({
+                "block_number": record["block_number"],
+                "expected": list(expected),
+                "actual": list(result) if result else None,
+                "hashes": [record["hashes"], hashes[0]],
+                "linked": record["previous_hash"] == previous_hash
+            })
+        previous_hash = record["hash"]
+    return summary
+
+def run_replay(args):
+    summary = replay_session(args.recording)
+    hashrate = summary["hashes"] / summary["seconds"] if summary["seconds"] > 0 else 0.0
+    print(f"Replayed {summary['blocks']} blocks from {summary['sessions']} sessions: "
+          f"{summary['hashes']} hashes in {summary['seconds']:.2f}s ({hashrate:.2f} H/s)")
+    for mismatch in summary["mismatches"]:
+        print(f"Mismatch at block #{mismatch['block_number']}: expected {mismatch['expected']}, "
+              f"got {mismatch['actual']}, hashes (recorded, replayed): {mismatch['hashes']}, "
+              f"linked to previous block: {mismatch['linked']}")
+    if summary["mismatches"]:
+        sys.exit(1)
+
+class IngestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.records = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.blocks = 0
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.records / elapsed if elapsed > 0 else 0.0
+        return (f"{self.records} records ({self.accepted} accepted, {self.rejected} rejected) "
+                f"into {self.blocks} blocks in {elapsed:.2f}s ({rate:.0f} records/s)")
+
+def parse_transaction_chunk(fmt, chunk):
+    # Runs in an ingest worker: decodes and validates one chunk of records
+    lines = []
+    rejected = 0
+    for record in chunk:
+        try:
+            if fmt == "ndjson":
+                record = json.loads(record)
+                fields = (record.get("sender"), record.get("recipient"), record.get("amount"))
+            else:
+                fields = record
+            sender, recipient, amount = (str(field).strip() if field is not None else "" for field in fields)
+            lines.append(validate_transaction(sender, recipient, amount))
+        except (ValueError, AttributeError, TypeError):
+            rejected += 1
+    return lines, rejected
+
+def iter_transaction_records(filename, fmt):
+    # NDJSON lines are decoded by the workers; CSV rows are split here (so
+    # quoted fields spanning lines work) and only validated by the workers
+    with open(filename, "r", newline="") as f:
+        if fmt == "ndjson":
+            for line in f:
+                if line.strip():
+                    yield line
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield (row.get("sender"), row.get("recipient"), row.get("amount"))
+
+def ingest_transactions(filename, fmt=None, max_block_size=INGEST_BLOCK_SIZE, chunk_size=INGEST_CHUNK_SIZE,
+                        jobs=None, stats=None):
+    # Yields pending block payloads (at most max_block_size characters each,
+    # in file order). At most INGEST_CHUNKS_IN_FLIGHT chunks per worker are
+    # read ahead, so memory stays bounded however large the file is.
+    fmt = fmt or ("csv" if filename.endswith(".csv") else "ndjson")
+    stats = stats or IngestStats()
+    jobs = jobs or os.cpu_count() or 1
+    pending = collections.deque()
+    block_lines = []
+    block_size = 0
+    
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        chunks = iter_chunks(iter_transaction_records(filename, fmt), chunk_size)
+        exhausted = False
+        while pending or not exhausted:
+            # Keep the workers fed, but no further ahead than the limit
+            while not exhausted and len(pending) < jobs * INGEST_CHUNKS_IN_FLIGHT:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                stats.records += len(chunk)
+                pending.append(pool.submit(parse_transaction_chunk, fmt, chunk))
+            if not pending:
+                break
+            
+            lines, rejected = pending.popleft().result()
+            stats.accepted += len(lines)
+            stats.rejected += rejected
+            for line in lines:
+                if block_lines and block_size + len(line) > max_block_size:
+                    stats.blocks += 1
+                    yield "".join(block_lines)
+                    block_lines = []
+                    block_size = 0
+                block_lines.append(line)
+                block_size += len(line)
+    
+    if block_lines:
+        stats.blocks += 1
+        yield "".join(block_lines)
+
+def run_ingest(args):
+    stats = IngestStats()
+    payloads = ingest_transactions(args.input, args.format, args.block_size, args.chunk_size, args.jobs, stats)
+    blockchain = Blockchain() if args.chain else None
+    last_report = time.perf_counter()
+    with open(args.output, "w") as f:
+        for payload in payloads:
+            if blockchain is not None:
+                block = blockchain.add_block(payload, args.difficulty)
+                mine_headless(blockchain, block, args.difficulty)
+                blockchain.append_block(block)
+            f.write(json.dumps({"transactions": payload}) + "\n")
+            if time.perf_counter() - last_report >= INGEST_REPORT_INTERVAL:
+                print(stats.report())
+                last_report = time.perf_counter()
+    if blockchain is not None:
+        with open(args.chain, "w") as f:
+            write_blockchain_json(blockchain.iter_blocks_json(), f)
+    print(stats.report())
+
+def search_batch(prefix, suffix, start, stop, difficulty):
+    # One bounded batch of a block template's nonces. Takes only bytes and
+    # ints so it can run in a worker process as well as in the host loop.
+    # Returns (nonce, hash, hashes), with nonce and hash None if no nonce in
+    # range(start, stop) meets the difficulty.
+    midstate = hashlib.sha256(prefix)
+    target = "0" * difficulty
+    for nonce in range(start, stop):
+        sha = midstate.copy()
+        sha.update(b"%d%s" % (nonce, suffix))
+        hash_result = sha.hexdigest()
+        if hash_result.startswith(target):
+            return nonce, hash_result, nonce - start + 1
+    return None, None, stop - start
+
+class SimulatorSession:
+    # Headless per-user state for SessionHost: its own chain, profile and
+    # stats, and nothing else, so hundreds fit in one process
+    __slots__ = ("session_id", "blockchain", "profile", "difficulty", "hashes",
+                 "blocks_mined", "balance", "mining_seconds", "block_seconds")
+    
+    def __init__(self, session_id, difficulty, prune_depth=None, segment_dir=DEFAULT_SEGMENT_DIR, clock=None):
+        self.session_id = session_id
+        self.blockchain = Blockchain(prune_depth, os.path.join(segment_dir, session_id), clock=clock)
+        self.profile = UserProfile()
+        self.profile.username = session_id
+        self.difficulty = difficulty
+        self.hashes = 0
+        self.blocks_mined = 0
+        self.balance = 0.0
+        self.mining_seconds = 0.0  # wall time spent on this session's blocks
+        self.block_seconds = 0.0  # wall time of the last block
+
+    def next_transactions(self):
+        timestamp = datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+        return f"{self.profile.username}->Reward->6.25 BTC\nTimestamp: {timestamp}"
+
+    def stats(self):
+        return {
+            "session": self.session_id,
+            "difficulty": self.difficulty,
+            "blocks": self.blocks_mined,
+            "hashes": self.hashes,
+            "balance": self.balance,
+            "mining_seconds": round(self.mining_seconds, 6),
+            "hashrate": self.hashes / self.mining_seconds if self.mining_seconds > 0 else 0.0,
+            "chain_valid": self.blockchain.is_chain_valid(),
+        }
+
+class SessionHost:
+    # Runs many SimulatorSessions in one process. Each session is an asyncio
+    # task that mines in batches of batch_size nonces; a batch needs one of
+    # the host's slots, and asyncio hands slots out in FIFO order, so every
+    # session waiting for hashing gets the same share of it. With processes
+    # set, batches run in a process pool (one slot per process plus one
+    # queued); otherwise they run in the loop itself, one at a time.
+    def __init__(self, sessions, batch_size=HOST_BATCH_SIZE, processes=0):
+        self.sessions = sessions
+        self.batch_size = batch_size
+        self.processes = processes
+        self.stopping = False
+        self.started = None
+
+    async def mine_block(self, session, slots, executor):
+        # Returns True once the block is sealed and appended, False if the
+        # host stopped first
+        loop = asyncio.get_running_loop()
+        blockchain = session.blockchain
+        block = blockchain.add_block(session.next_transactions(), session.difficulty)
+        space = SearchSpace(block, unit_size=self.batch_size)
+        block_start = time.perf_counter()
+        try:
+            while not self.stopping:
+                unit = space.next_unit()
+                prefix, suffix = blockchain.hash_template(block, unit.extra_nonce, unit.timestamp_ns)
+                batch = (prefix, suffix, unit.nonces.start, unit.nonces.stop, session.difficulty)
+                async with slots:
+                    if executor is None:
+                        nonce, hash_result, hashes = search_batch(*batch)
+                    else:
+                        nonce, hash_result, hashes = await loop.run_in_executor(executor, search_batch, *batch)
+                session.hashes += hashes
+                HASHES_TOTAL.inc(hashes, worker="host")
+                if nonce is not None:
+                    space.seal(block, unit, nonce, hash_result)
+                    blockchain.append_block(block)
+                    session.blocks_mined += 1
+                    session.balance += 6.25  # BTC reward
+                    BLOCKS_MINED.inc()
+                    return True
+                if executor is None:
+                    # Let the other sessions have the next turn
+                    await asyncio.sleep(0)
+            return False
+        finally:
+            session.block_seconds = time.perf_counter() - block_start
+            session.mining_seconds += session.block_seconds
+
+    async def run_session(self, session, slots, executor, blocks):
+        while not self.stopping and (blocks is None or session.blocks_mined < blocks):
+            await self.mine_block(session, slots, executor)
+
+    async def run(self, duration=None, blocks=None, on_report=None):
+        # Mines until every session has `blocks` blocks or `duration` seconds
+        # have passed, whichever comes first
+        self.stopping = False
+        self.started = time.perf_counter()
+        slots = asyncio.Semaphore(self.processes + 1 if self.processes else 1)
+        executor = None
+        if self.processes:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.processes)
+        tasks = [asyncio.create_task(self.run_session(session, slots, executor, blocks))
+                 for session in self.sessions]
+        try:
+            done = asyncio.gather(*tasks)
+            deadline = None if duration is None else self.started + duration
+            while not done.done():
+                timeout = HOST_REPORT_INTERVAL
+                if deadline is not None:
+                    timeout = min(timeout, max(deadline - time.perf_counter(), 0))
+                await asyncio.wait([done], timeout=timeout)
+                if deadline is not None and time.perf_counter() >= deadline:
+                    self.stopping = True
+                if not done.done() and on_report is not None:
+                    on_report(self.report())
+            await done
+        finally:
+            self.stopping = True
+            if executor is not None:
+                executor.shutdown()
+        return self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started if self.started is not None else 0.0
+        hashes = [session.hashes for session in self.sessions]
+        total = sum(hashes)
+        # Jain's index: 1.0 when every session hashed the same amount
+        squares = sum(count * count for count in hashes)
+        fairness = total * total / (len(hashes) * squares) if squares else 1.0
+        return {
+            "sessions": len(self.sessions),
+            "elapsed": round(elapsed, 6),
+            "hashes": total,
+            "hashrate": total / elapsed if elapsed > 0 else 0.0,
+            "blocks": sum(session.blocks_mined for session in self.sessions),
+            "min_session_hashes": min(hashes, default=0),
+            "max_session_hashes": max(hashes, default=0),
+            "fairness": round(fairness, 4),
+        }
+
+def run_host(args):
+    sessions = [SimulatorSession(f"session-{index}", args.difficulty, args.prune_depth, args.segment_dir)
+                for index in range(args.sessions)]
+    host = SessionHost(sessions, args.batch_size, args.processes)
+    
+    def report(summary):
+        print(f"{summary['blocks']} blocks, {summary['hashes']} hashes "
+              f"({summary['hashrate']:.0f} H/s), fairness {summary['fairness']}")
+    
+    summary = asyncio.run(host.run(args.duration, args.blocks, report))
+    if args.output:
+        with open(args.output, "w") as f:
+            for session in sessions:
+                f.write(json.dumps(session.stats()) + "\n")
+    print(json.dumps(summary, indent=4))
+
+class ThemeManager:
+    # Widgets are registered with the palette role of each color option when
+    # they are created, so switching themes is one pass over that list
+    # instead of a search through the widget tree.
+    def __init__(self, root, theme):
+        self.root = root
+        self.theme = theme
+        self.widgets = []
+        self.style = ttk.Style(root)
+
+    def register(self, widget, **roles):
+        palette = THEME_PALETTES[self.theme]
+        widget.configure(**{option: palette[role] for option, role in roles.items()})
+        self.widgets.append((widget, roles))
+        return widget
+
+    def apply(self, theme):
+        palette = THEME_PALETTES[theme]
+        if theme != self.theme:
+            self.theme = theme
+            live_widgets = []
+            for widget, roles in self.widgets:
+                try:
+                    widget.configure(**{option: palette[role] for option, role in roles.items()})
+                except tk.TclError:
+                    # Widget was destroyed; stop tracking it
+                    continue
+                live_widgets.append((widget, roles))
+            self.widgets = live_widgets
+        
+        # ttk widgets follow their styles
+        self.root.configure(bg=palette["bg"])
+        for style_name in ("TCheckbutton", "Switch.TCheckbutton", "Horizontal.TScale"):
+            self.style.configure(style_name, background=palette["bg"], foreground=palette["text"])
 
 class MiningSimulator:
-    def __init__(self, root):
+    def __init__(self, root, prune_depth=None, segment_dir=DEFAULT_SEGMENT_DIR, clock=None, recorder=None,
+                 scheduler=None):
         self.root = root
+        self.scheduler = scheduler or MiningScheduler()
+        self.prune_depth = prune_depth
+        self.segment_dir = segment_dir
+        self.clock = clock or SYSTEM_CLOCK
+        self.recorder = recorder
         root.title("Bitcoin Mining Simulator")
         root.geometry("1000x700")
-        self.root.configure(bg="#f0f0f0")
         
         # Initialize blockchain and user profile
-        self.blockchain = Blockchain()
+        self.blockchain = self.new_blockchain()
+        self.start_recording_session()
         self.user_profile = UserProfile()
+        self.profile_store = ProfileStore(self.user_profile, on_error=self.report_profile_error)
         self.load_profile()
+        root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.theme_manager = ThemeManager(root, self.user_profile.theme)
         
         # Mining variables
         self.mining_thread = None
@@ -140,6 +1775,7 @@ class MiningSimulator:
         self.found_blocks = 0
         self.difficulty = 4
         self.available_balance = 0.0
+        self.probe_due_at = None
         
         # Create GUI frames
         self.create_header_frame()
@@ -155,12 +1791,13 @@ class MiningSimulator:
         
         # Update stats periodically
         self.update_stats()
+        self.probe_event_latency()
         
         # Apply theme
         self.apply_theme()
     
     def create_header_frame(self):
-        header_frame = tk.Frame(self.root, bg=self.get_theme_color("header_bg"), height=60)
+        header_frame = self.themed(tk.Frame(self.root, height=60), bg="header_bg")
         header_frame.pack(fill=tk.X, padx=10, pady=10)
         
         # Theme toggle
@@ -172,54 +1809,48 @@ class MiningSimulator:
         )
         self.theme_switch.pack(side=tk.RIGHT, padx=10)
         
-        title_label = tk.Label(
+        title_label = self.themed(tk.Label(
             header_frame, 
             text="Bitcoin Mining Simulator", 
-            font=("Arial", 20, "bold"),
-            fg=self.get_theme_color("text"),
-            bg=self.get_theme_color("header_bg")
-        )
+            font=("Arial", 20, "bold")
+        ), bg="header_bg", fg="text")
         title_label.pack(pady=10)
     
     def create_blockchain_frame(self):
-        blockchain_frame = tk.LabelFrame(
+        blockchain_frame = self.themed(tk.LabelFrame(
             self.root, 
             text="Blockchain Explorer", 
-            font=("Arial", 12, "bold"),
-            bg="#f0f0f0"
-        )
+            font=("Arial", 12, "bold")
+        ), bg="bg", fg="text")
         blockchain_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
-        self.blockchain_text = scrolledtext.ScrolledText(
+        self.blockchain_text = self.themed(scrolledtext.ScrolledText(
             blockchain_frame, 
             height=10, 
-            font=("Courier", 10),
-            bg="#f8f8f8"
-        )
+            font=("Courier", 10)
+        ), bg="text_bg", fg="text", insertbackground="text")
         self.blockchain_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
         # Update blockchain display
         self.update_blockchain_display()
     
     def create_mining_frame(self):
-        mining_frame = tk.LabelFrame(
+        mining_frame = self.themed(tk.LabelFrame(
             self.root, 
             text="Mining Control", 
-            font=("Arial", 12, "bold"),
-            bg="#f0f0f0"
-        )
+            font=("Arial", 12, "bold")
+        ), bg="bg", fg="text")
         mining_frame.pack(fill=tk.X, padx=10, pady=5)
         
         # Difficulty slider
-        difficulty_frame = tk.Frame(mining_frame, bg="#f0f0f0")
+        difficulty_frame = self.themed(tk.Frame(mining_frame), bg="bg")
         difficulty_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        difficulty_label = tk.Label(
+        difficulty_label = self.themed(tk.Label(
             difficulty_frame, 
             text="Mining Difficulty: ",
-            font=("Arial", 10),
-            bg="#f0f0f0"
-        )
+            font=("Arial", 10)
+        ), bg="bg", fg="text")
         difficulty_label.pack(side=tk.LEFT)
         
         self.difficulty_slider = ttk.Scale(
@@ -233,51 +1864,47 @@ class MiningSimulator:
         self.difficulty_slider.set(self.difficulty)
         self.difficulty_slider.pack(side=tk.LEFT, padx=5)
         
-        self.difficulty_value_label = tk.Label(
+        self.difficulty_value_label = self.themed(tk.Label(
             difficulty_frame, 
             text=f"{self.difficulty}",
             font=("Arial", 10),
-            bg="#f0f0f0",
             width=5
-        )
+        ), bg="bg", fg="text")
         self.difficulty_value_label.pack(side=tk.LEFT)
         
         # Mining status and controls
-        controls_frame = tk.Frame(mining_frame, bg="#f0f0f0")
+        controls_frame = self.themed(tk.Frame(mining_frame), bg="bg")
         controls_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        self.status_label = tk.Label(
+        self.status_label = self.themed(tk.Label(
             controls_frame, 
             text="Status: Idle",
             font=("Arial", 10),
-            bg="#f0f0f0",
             width=20,
             anchor=tk.W
-        )
+        ), bg="bg", fg="text")
         self.status_label.pack(side=tk.LEFT, padx=5)
         
-        self.hashrate_label = tk.Label(
+        self.hashrate_label = self.themed(tk.Label(
             controls_frame, 
             text="Hashrate: 0 H/s",
             font=("Arial", 10),
-            bg="#f0f0f0",
             width=20,
             anchor=tk.W
-        )
+        ), bg="bg", fg="text")
         self.hashrate_label.pack(side=tk.LEFT, padx=5)
         
-        self.balance_label = tk.Label(
+        self.balance_label = self.themed(tk.Label(
             controls_frame, 
             text=f"Balance: {self.available_balance:.8f} BTC",
             font=("Arial", 10),
-            bg="#f0f0f0",
             width=25,
             anchor=tk.W
-        )
+        ), bg="bg", fg="text")
         self.balance_label.pack(side=tk.LEFT, padx=5)
         
         # Mining buttons
-        button_frame = tk.Frame(mining_frame, bg="#f0f0f0")
+        button_frame = self.themed(tk.Frame(mining_frame), bg="bg")
         button_frame.pack(fill=tk.X, padx=10, pady=5)
         
         self.mine_button = tk.Button(
@@ -307,59 +1934,55 @@ class MiningSimulator:
         clear_button.pack(side=tk.LEFT, padx=5, pady=5)
     
     def create_transaction_frame(self):
-        transaction_frame = tk.LabelFrame(
+        transaction_frame = self.themed(tk.LabelFrame(
             self.root, 
             text="Create Transaction", 
-            font=("Arial", 12, "bold"),
-            bg="#f0f0f0"
-        )
+            font=("Arial", 12, "bold")
+        ), bg="bg", fg="text")
         transaction_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        entry_frame = tk.Frame(transaction_frame, bg="#f0f0f0")
+        entry_frame = self.themed(tk.Frame(transaction_frame), bg="bg")
         entry_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        tk.Label(
+        self.themed(tk.Label(
             entry_frame, 
             text="Sender:",
-            font=("Arial", 10),
-            bg="#f0f0f0"
-        ).grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+            font=("Arial", 10)
+        ), bg="bg", fg="text").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
         
-        self.sender_entry = tk.Entry(
+        self.sender_entry = self.themed(tk.Entry(
             entry_frame,
             font=("Arial", 10),
             width=30
-        )
+        ), bg="input_bg", fg="text", insertbackground="text")
         self.sender_entry.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
         self.sender_entry.insert(0, "Alice")
         
-        tk.Label(
+        self.themed(tk.Label(
             entry_frame, 
             text="Recipient:",
-            font=("Arial", 10),
-            bg="#f0f0f0"
-        ).grid(row=0, column=2, padx=5, pady=5, sticky=tk.W)
+            font=("Arial", 10)
+        ), bg="bg", fg="text").grid(row=0, column=2, padx=5, pady=5, sticky=tk.W)
         
-        self.recipient_entry = tk.Entry(
+        self.recipient_entry = self.themed(tk.Entry(
             entry_frame,
             font=("Arial", 10),
             width=30
-        )
+        ), bg="input_bg", fg="text", insertbackground="text")
         self.recipient_entry.grid(row=0, column=3, padx=5, pady=5, sticky=tk.W)
         self.recipient_entry.insert(0, "Bob")
         
-        tk.Label(
+        self.themed(tk.Label(
             entry_frame, 
             text="Amount:",
-            font=("Arial", 10),
-            bg="#f0f0f0"
-        ).grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
+            font=("Arial", 10)
+        ), bg="bg", fg="text").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
         
-        self.amount_entry = tk.Entry(
+        self.amount_entry = self.themed(tk.Entry(
             entry_frame,
             font=("Arial", 10),
             width=10
-        )
+        ), bg="input_bg", fg="text", insertbackground="text")
         self.amount_entry.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
         self.amount_entry.insert(0, "10")
         
@@ -376,22 +1999,20 @@ class MiningSimulator:
         )
         add_button.grid(row=1, column=2, padx=5, pady=5, sticky=tk.W)
         
-        self.transaction_text = scrolledtext.ScrolledText(
+        self.transaction_text = self.themed(scrolledtext.ScrolledText(
             transaction_frame, 
             height=3, 
-            font=("Courier", 10),
-            bg="#f8f8f8"
-        )
+            font=("Courier", 10)
+        ), bg="text_bg", fg="text", insertbackground="text")
         self.transaction_text.pack(fill=tk.X, padx=10, pady=5)
         self.transaction_text.insert(tk.END, "Enter transaction details above")
     
     def create_monitoring_frame(self):
-        monitoring_frame = tk.LabelFrame(
+        monitoring_frame = self.themed(tk.LabelFrame(
             self.root, 
             text="Mining Performance", 
-            font=("Arial", 12, "bold"),
-            bg="#f0f0f0"
-        )
+            font=("Arial", 12, "bold")
+        ), bg="bg", fg="text")
         monitoring_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
         # Create matplotlib figure
@@ -402,66 +2023,59 @@ class MiningSimulator:
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
     
     def create_profile_frame(self):
-        profile_frame = tk.LabelFrame(
+        profile_frame = self.themed(tk.LabelFrame(
             self.root, 
             text="Profile Settings", 
-            font=("Arial", 12, "bold"),
-            bg=self.get_theme_color("bg"),
-            fg=self.get_theme_color("text")
-        )
+            font=("Arial", 12, "bold")
+        ), bg="bg", fg="text")
         profile_frame.pack(fill=tk.X, padx=10, pady=5)
         
         # Profile form
-        form_frame = tk.Frame(profile_frame, bg=self.get_theme_color("bg"))
+        form_frame = self.themed(tk.Frame(profile_frame), bg="bg")
         form_frame.pack(fill=tk.X, padx=10, pady=5)
         
         # Username
-        tk.Label(
+        self.themed(tk.Label(
             form_frame, 
             text="Username:",
-            font=("Arial", 10),
-            bg=self.get_theme_color("bg"),
-            fg=self.get_theme_color("text")
-        ).grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+            font=("Arial", 10)
+        ), bg="bg", fg="text").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
         
-        self.username_entry = tk.Entry(form_frame, font=("Arial", 10))
+        self.username_entry = self.themed(
+            tk.Entry(form_frame, font=("Arial", 10)), bg="input_bg", fg="text", insertbackground="text")
         self.username_entry.grid(row=0, column=1, padx=5, pady=5)
         self.username_entry.insert(0, self.user_profile.username)
         
         # Email
-        tk.Label(
+        self.themed(tk.Label(
             form_frame, 
             text="Email:",
-            font=("Arial", 10),
-            bg=self.get_theme_color("bg"),
-            fg=self.get_theme_color("text")
-        ).grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
+            font=("Arial", 10)
+        ), bg="bg", fg="text").grid(row=1, column=0, padx=5, pady=5, sticky=tk.W)
         
-        self.email_entry = tk.Entry(form_frame, font=("Arial", 10))
+        self.email_entry = self.themed(
+            tk.Entry(form_frame, font=("Arial", 10)), bg="input_bg", fg="text", insertbackground="text")
         self.email_entry.grid(row=1, column=1, padx=5, pady=5)
         self.email_entry.insert(0, self.user_profile.email)
         
         # Wallet Address
-        tk.Label(
+        self.themed(tk.Label(
             form_frame, 
             text="Wallet Address:",
-            font=("Arial", 10),
-            bg=self.get_theme_color("bg"),
-            fg=self.get_theme_color("text")
-        ).grid(row=2, column=0, padx=5, pady=5, sticky=tk.W)
+            font=("Arial", 10)
+        ), bg="bg", fg="text").grid(row=2, column=0, padx=5, pady=5, sticky=tk.W)
         
-        self.wallet_entry = tk.Entry(form_frame, font=("Arial", 10))
+        self.wallet_entry = self.themed(
+            tk.Entry(form_frame, font=("Arial", 10)), bg="input_bg", fg="text", insertbackground="text")
         self.wallet_entry.grid(row=2, column=1, padx=5, pady=5)
         self.wallet_entry.insert(0, self.user_profile.wallet_address)
         
         # Mining Preference
-        tk.Label(
+        self.themed(tk.Label(
             form_frame, 
             text="Mining Preference:",
-            font=("Arial", 10),
-            bg=self.get_theme_color("bg"),
-            fg=self.get_theme_color("text")
-        ).grid(row=3, column=0, padx=5, pady=5, sticky=tk.W)
+            font=("Arial", 10)
+        ), bg="bg", fg="text").grid(row=3, column=0, padx=5, pady=5, sticky=tk.W)
         
         self.mining_pref_var = tk.StringVar(value=self.user_profile.mining_preference)
         mining_pref_menu = ttk.Combobox(
@@ -486,36 +2100,40 @@ class MiningSimulator:
             text="Save Profile",
             command=self.save_profile
         ).grid(row=5, column=0, columnspan=2, pady=10)
+        
+        # Non-blocking save notice; failures still get a dialog
+        self.profile_notice_label = self.themed(tk.Label(
+            form_frame,
+            text="",
+            font=("Arial", 9)
+        ), bg="bg", fg="text")
+        self.profile_notice_label.grid(row=6, column=0, columnspan=2)
+        self.profile_notice_after = None
 
     def create_referral_frame(self):
-        referral_frame = tk.LabelFrame(
+        referral_frame = self.themed(tk.LabelFrame(
             self.root, 
             text="Refer & Earn", 
-            font=("Arial", 12, "bold"),
-            bg=self.get_theme_color("bg"),
-            fg=self.get_theme_color("text")
-        )
+            font=("Arial", 12, "bold")
+        ), bg="bg", fg="text")
         referral_frame.pack(fill=tk.X, padx=10, pady=5)
         
         # Referral code
-        code_frame = tk.Frame(referral_frame, bg=self.get_theme_color("bg"))
+        code_frame = self.themed(tk.Frame(referral_frame), bg="bg")
         code_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        tk.Label(
+        self.themed(tk.Label(
             code_frame, 
             text="Your Referral Code:",
-            font=("Arial", 10),
-            bg=self.get_theme_color("bg"),
-            fg=self.get_theme_color("text")
-        ).pack(side=tk.LEFT, padx=5)
+            font=("Arial", 10)
+        ), bg="bg", fg="text").pack(side=tk.LEFT, padx=5)
         
-        self.referral_code_label = tk.Label(
+        self.referral_code_label = self.themed(tk.Label(
             code_frame,
             text=self.user_profile.referral_code,
             font=("Arial", 10, "bold"),
-            bg=self.get_theme_color("bg"),
             fg="#f7931a"
-        )
+        ), bg="bg")
         self.referral_code_label.pack(side=tk.LEFT, padx=5)
         
         ttk.Button(
@@ -525,44 +2143,36 @@ class MiningSimulator:
         ).pack(side=tk.LEFT, padx=5)
         
         # Referral stats
-        stats_frame = tk.Frame(referral_frame, bg=self.get_theme_color("bg"))
+        stats_frame = self.themed(tk.Frame(referral_frame), bg="bg")
         stats_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        tk.Label(
+        self.themed(tk.Label(
             stats_frame, 
             text=f"Total Referrals: {self.user_profile.total_referrals}",
-            font=("Arial", 10),
-            bg=self.get_theme_color("bg"),
-            fg=self.get_theme_color("text")
-        ).pack(side=tk.LEFT, padx=5)
+            font=("Arial", 10)
+        ), bg="bg", fg="text").pack(side=tk.LEFT, padx=5)
         
-        tk.Label(
+        self.themed(tk.Label(
             stats_frame, 
             text=f"Reward Points: {self.user_profile.referral_points}",
-            font=("Arial", 10),
-            bg=self.get_theme_color("bg"),
-            fg=self.get_theme_color("text")
-        ).pack(side=tk.LEFT, padx=5)
+            font=("Arial", 10)
+        ), bg="bg", fg="text").pack(side=tk.LEFT, padx=5)
         
         # Referral history
-        history_frame = tk.Frame(referral_frame, bg=self.get_theme_color("bg"))
+        history_frame = self.themed(tk.Frame(referral_frame), bg="bg")
         history_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        tk.Label(
+        self.themed(tk.Label(
             history_frame, 
             text="Recent Referrals:",
-            font=("Arial", 10),
-            bg=self.get_theme_color("bg"),
-            fg=self.get_theme_color("text")
-        ).pack(anchor=tk.W, padx=5)
+            font=("Arial", 10)
+        ), bg="bg", fg="text").pack(anchor=tk.W, padx=5)
         
-        self.referral_history_text = scrolledtext.ScrolledText(
+        self.referral_history_text = self.themed(scrolledtext.ScrolledText(
             history_frame,
             height=5,
-            font=("Courier", 9),
-            bg=self.get_theme_color("bg"),
-            fg=self.get_theme_color("text")
-        )
+            font=("Courier", 9)
+        ), bg="text_bg", fg="text", insertbackground="text")
         self.referral_history_text.pack(fill=tk.X, padx=5, pady=5)
         self.update_referral_history()
     
@@ -615,7 +2225,10 @@ class MiningSimulator:
                 self.transaction_text.insert(tk.END, transactions)
             
             # Start mining thread
-            self.mining_thread = threading.Thread(target=self.mine_block, args=(transactions,))
+            # A fixed name keeps the per-worker metric series to one per
+            # simulator instead of one per mined block
+            self.mining_thread = threading.Thread(
+                target=PROFILER.profile_thread, args=(self.mine_block, transactions), name="miner")
             self.mining_thread.daemon = True
             self.mining_thread.start()
     
@@ -627,50 +2240,67 @@ class MiningSimulator:
     
     def mine_block(self, transactions):
         new_block = self.blockchain.add_block(transactions, self.difficulty)
-        prefix_str = '0' * self.difficulty
         
-        self.start_time = time.time()
+        self.start_time = self.clock.monotonic()
         self.hash_count = 0
-        block_start_time = time.time()
+        block_start_time = self.clock.monotonic()
         
-        for nonce in range(MAX_NONCE):
-            if not self.is_mining:
-                return
-            
-            # Calculate hash
-            hash_result = self.blockchain.calculate_hash(new_block, nonce)
-            self.hash_count += 1
-            
-            # Update UI every 10000 hashes
-            if self.hash_count % 10000 == 0:
-                elapsed = time.time() - self.start_time
-                if elapsed > 0:
-                    self.mining_speed = self.hash_count / elapsed
-                    # Update on main thread
-                    self.root.after(0, self.update_mining_stats)
-            
-            # Check if hash matches difficulty
-            if hash_result.startswith(prefix_str):
-                # Block found
-                new_block.nonce = nonce
-                new_block.hash = hash_result
-                self.blockchain.chain.append(new_block)
-                
-                # Calculate mining time
-                mining_time = time.time() - block_start_time
-                
-                # Add mining reward
-                self.found_blocks += 1
-                self.available_balance += 6.25  # BTC reward
-                
-                # Update block time chart
-                self.block_data_x.append(new_block.block_number)
-                self.block_data_y.append(mining_time)
-                
-                # Update UI on main thread
-                self.root.after(0, self.update_ui_after_block_found, mining_time, hash_result)
-                return
+        space = SearchSpace(new_block)
+        try:
+            result = mine_search_space(
+                self.blockchain,
+                new_block,
+                self.difficulty,
+                space,
+                lambda: self.is_mining,
+                self.on_mining_progress,
+                self.scheduler
+            )
+        except SearchSpaceExhausted as e:
+            self.root.after(0, self.on_mining_failed, str(e))
+            return
+        if result is None:
+            return
+        
+        # Block found
+        unit, nonce, hash_result = result
+        BLOCKS_MINED.inc()
+        space.seal(new_block, unit, nonce, hash_result)
+        # Record before appending: append_block may prune the block's body
+        if self.recorder is not None:
+            self.recorder.record_block(new_block, space, self.hash_count)
+        self.blockchain.append_block(new_block)
+        
+        # Calculate mining time
+        mining_time = self.clock.monotonic() - block_start_time
+        
+        # Add mining reward
+        self.found_blocks += 1
+        self.available_balance += 6.25  # BTC reward
+        
+        # Update block time chart
+        self.block_data_x.append(new_block.block_number)
+        self.block_data_y.append(mining_time)
+        
+        # Update UI on main thread
+        self.root.after(0, self.update_ui_after_block_found, mining_time, hash_result)
+    
+    def on_mining_failed(self, message):
+        self.stop_mining()
+        self.status_label.config(text="Status: Failed")
+        messagebox.showerror("Mining Failed", message)
     
+    def on_mining_progress(self, hashes):
+        # Called from the mining thread every PROGRESS_INTERVAL hashes
+        self.hash_count += hashes
+        elapsed = self.clock.monotonic() - self.start_time
+        if elapsed > 0:
+            self.mining_speed = self.hash_count / elapsed
+            HASHRATE.set(self.mining_speed, worker=threading.current_thread().name)
+            # Update on main thread
+            self.root.after(0, self.update_mining_stats)
+    
+    @timed_callback("update_ui_after_block_found")
     def update_ui_after_block_found(self, mining_time, hash_result):
         # Update blockchain display
         self.update_blockchain_display()
@@ -695,7 +2325,8 @@ class MiningSimulator:
     def reset_blockchain(self):
         if messagebox.askyesno("Reset Blockchain", "Are you sure you want to reset the blockchain?"):
             self.stop_mining()
-            self.blockchain = Blockchain()
+            self.blockchain = self.new_blockchain()
+            self.start_recording_session()
             self.update_blockchain_display()
             self.found_blocks = 0
             self.available_balance = 0.0
@@ -713,17 +2344,12 @@ class MiningSimulator:
         recipient = self.recipient_entry.get()
         amount = self.amount_entry.get()
         
-        if not sender or not recipient or not amount:
-            messagebox.showerror("Error", "Please fill in all fields")
-            return
-        
         try:
-            amount_float = float(amount)
-        except ValueError:
-            messagebox.showerror("Error", "Amount must be a number")
+            transaction_text = validate_transaction(sender, recipient, amount)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
         
-        transaction_text = f"{sender}->{recipient}->{amount}\n"
         self.transaction_text.delete("1.0", tk.END)
         self.transaction_text.insert(tk.END, transaction_text)
         
@@ -734,10 +2360,13 @@ class MiningSimulator:
         for block in self.blockchain.chain:
             self.blockchain_text.insert(tk.END, f"Block #{block.block_number}\n")
             self.blockchain_text.insert(tk.END, f"Timestamp: {block.timestamp}\n")
-            self.blockchain_text.insert(tk.END, f"Transactions: {block.transactions}\n")
+            transactions = "[pruned]" if block.transactions is None else block.transactions
+            self.blockchain_text.insert(tk.END, f"Transactions: {transactions}\n")
             self.blockchain_text.insert(tk.END, f"Previous Hash: {block.previous_hash[:15]}...\n")
             self.blockchain_text.insert(tk.END, f"Hash: {block.hash[:15]}...\n")
             self.blockchain_text.insert(tk.END, f"Nonce: {block.nonce}\n")
+            if block.extra_nonce:
+                self.blockchain_text.insert(tk.END, f"Extra Nonce: {block.extra_nonce}\n")
             self.blockchain_text.insert(tk.END, f"Difficulty: {block.difficulty}\n")
             self.blockchain_text.insert(tk.END, "-" * 50 + "\n")
         
@@ -745,11 +2374,12 @@ class MiningSimulator:
         self.blockchain_text.tag_add("header", "1.0", "1.end")
         self.blockchain_text.tag_config("header", foreground="blue", font=("Courier", 10, "bold"))
     
+    @timed_callback("update_mining_stats")
     def update_mining_stats(self):
         self.hashrate_label.config(text=f"Hashrate: {self.mining_speed:.2f} H/s")
         
         # Update hashrate chart
-        current_time = time.time() - self.start_time
+        current_time = self.clock.monotonic() - self.start_time
         self.hashrate_data_x.append(current_time)
         self.hashrate_data_y.append(self.mining_speed)
         
@@ -760,6 +2390,7 @@ class MiningSimulator:
         
         self.update_charts()
     
+    @timed_callback("update_charts")
     def update_charts(self):
         # Update hashrate chart
         if self.hashrate_data_x:
@@ -775,43 +2406,62 @@ class MiningSimulator:
         
         self.canvas.draw()
     
+    def probe_event_latency(self):
+        # How late this timer fires is a proxy for Tk event-queue lag,
+        # which the scheduler uses to size the mining thread's batches
+        now = time.perf_counter()
+        if self.probe_due_at is not None:
+            latency = max(0.0, now - self.probe_due_at)
+            TK_EVENT_LAG_SECONDS.observe(latency)
+            if self.is_mining:
+                self.scheduler.report_latency(latency)
+        self.probe_due_at = now + LATENCY_PROBE_MS / 1000
+        self.root.after(LATENCY_PROBE_MS, self.probe_event_latency)
+    
     def update_stats(self):
         # Update UI elements if mining is active
         if self.is_mining:
-            elapsed = time.time() - self.start_time
+            elapsed = self.clock.monotonic() - self.start_time
             if elapsed > 0:
                 self.mining_speed = self.hash_count / elapsed
                 self.hashrate_label.config(text=f"Hashrate: {self.mining_speed:.2f} H/s")
         
         # Schedule the next update
-        self.root.after(1000, self.update_stats)
+        self.root.after(STATS_INTERVAL_MS, self.update_stats)
     
     def save_blockchain(self, filename="blockchain.json"):
+        start = time.perf_counter()
         with open(filename, "w") as f:
-            json.dump(self.blockchain.to_json(), f, indent=4)
+            write_blockchain_json(self.blockchain.iter_blocks_json(), f)
+        PERSISTENCE_WRITE_SECONDS.observe(time.perf_counter() - start, target="blockchain")
         messagebox.showinfo("Success", f"Blockchain saved to {filename}")
     
+    def save_snapshot(self, filename="blockchain.snapshot"):
+        start = time.perf_counter()
+        self.blockchain.snapshot(filename)
+        PERSISTENCE_WRITE_SECONDS.observe(time.perf_counter() - start, target="snapshot")
+        messagebox.showinfo("Success", f"Snapshot saved to {filename}")
+    
+    def new_blockchain(self):
+        return Blockchain(self.prune_depth, self.segment_dir, clock=self.clock)
+    
+    def start_recording_session(self):
+        if self.recorder is not None:
+            self.recorder.start_session(self.blockchain)
+    
     def load_blockchain(self, filename="blockchain.json"):
         try:
             with open(filename, "r") as f:
                 blockchain_data = json.load(f)
             
             # Create new blockchain
-            self.blockchain = Blockchain()
+            self.blockchain = self.new_blockchain()
             self.blockchain.chain = []
             
             # Add blocks from file
             for block_data in blockchain_data:
-                block = Block(
-                    block_data["block_number"],
-                    block_data["transactions"],
-                    block_data["previous_hash"],
-                    block_data["difficulty"]
-                )
-                block.hash = block_data["hash"]
-                block.nonce = block_data["nonce"]
-                block.timestamp = block_data["timestamp"]
-                self.blockchain.chain.append(block)
+                self.blockchain.append_block(Block.from_json(block_data))
+            self.start_recording_session()
             
             self.update_blockchain_display()
             messagebox.showinfo("Success", f"Blockchain loaded from {filename}")
@@ -821,59 +2471,13 @@ class MiningSimulator:
     def toggle_theme(self):
         self.user_profile.theme = "dark" if self.user_profile.theme == "light" else "light"
         self.apply_theme()
-        self.save_profile()
+        self.profile_store.schedule_save()
 
     def apply_theme(self):
-        theme_colors = {
-            "light": {
-                "bg": "#f0f0f0",
-                "text": "#333333",
-                "header_bg": "#1E3D59",
-                "card_bg": "#ffffff",
-                "input_bg": "#ffffff"
-            },
-            "dark": {
-                "bg": "#1a1a1a",
-                "text": "#ffffff",
-                "header_bg": "#0d1a26",
-                "card_bg": "#2d2d2d",
-                "input_bg": "#333333"
-            }
-        }
-        
-        colors = theme_colors[self.user_profile.theme]
-        self.root.configure(bg=colors["bg"])
-        
-        # Update all widgets with new colors
-        for widget in self.root.winfo_children():
-            if isinstance(widget, tk.LabelFrame):
-                widget.configure(bg=colors["bg"], fg=colors["text"])
-                for child in widget.winfo_children():
-                    if isinstance(child, tk.Label):
-                        child.configure(bg=colors["bg"], fg=colors["text"])
-                    elif isinstance(child, tk.Entry):
-                        child.configure(bg=colors["input_bg"], fg=colors["text"])
-                    elif isinstance(child, scrolledtext.ScrolledText):
-                        child.configure(bg=colors["bg"], fg=colors["text"])
-
-    def get_theme_color(self, color_type):
-        theme_colors = {
-            "light": {
-                "bg": "#f0f0f0",
-                "text": "#333333",
-                "header_bg": "#1E3D59",
-                "card_bg": "#ffffff",
-                "input_bg": "#ffffff"
-            },
-            "dark": {
-                "bg": "#1a1a1a",
-                "text": "#ffffff",
-                "header_bg": "#0d1a26",
-                "card_bg": "#2d2d2d",
-                "input_bg": "#333333"
-            }
-        }
-        return theme_colors[self.user_profile.theme][color_type]
+        self.theme_manager.apply(self.user_profile.theme)
+
+    def themed(self, widget, **roles):
+        return self.theme_manager.register(widget, **roles)
 
     def save_profile(self):
         self.user_profile.username = self.username_entry.get()
@@ -882,21 +2486,33 @@ class MiningSimulator:
         self.user_profile.mining_preference = self.mining_pref_var.get()
         self.user_profile.notifications_enabled = self.notifications_var.get()
         
-        try:
-            with open("profile.json", "w") as f:
-                json.dump(self.user_profile.to_json(), f)
-            messagebox.showinfo("Success", "Profile saved successfully!")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save profile: {str(e)}")
+        self.profile_store.schedule_save()
+        # Written in the background; a failure is reported by report_profile_error
+        self.show_profile_notice("Saving profile in the background...")
+
+    def show_profile_notice(self, text):
+        self.profile_notice_label.config(text=text)
+        if self.profile_notice_after is not None:
+            self.root.after_cancel(self.profile_notice_after)
+        self.profile_notice_after = self.root.after(PROFILE_NOTICE_MS, self.clear_profile_notice)
+
+    def clear_profile_notice(self):
+        self.profile_notice_after = None
+        self.profile_notice_label.config(text="")
 
     def load_profile(self):
-        try:
-            with open("profile.json", "r") as f:
-                data = json.load(f)
-                self.user_profile.from_json(data)
-        except FileNotFoundError:
-            # Use default profile if file doesn't exist
-            pass
+        self.profile_store.load()
+
+    def report_profile_error(self, error):
+        # Called from the profile store thread
+        self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to save profile: {str(error)}"))
+
+    def on_close(self):
+        self.stop_mining()
+        self.profile_store.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        self.root.destroy()
 
     def copy_referral_code(self):
         self.root.clipboard_clear()
@@ -905,7 +2521,7 @@ class MiningSimulator:
 
     def update_referral_history(self):
         self.referral_history_text.delete(1.0, tk.END)
-        for referral in self.user_profile.referral_history[-5:]:  # Show last 5 referrals
+        for referral in list(self.user_profile.referral_history)[-5:]:  # Show last 5 referrals
             self.referral_history_text.insert(tk.END, f"{referral['date']}: {referral['code']} - {referral['points']} points\n")
 
     def add_referral(self, code):
@@ -918,20 +2534,147 @@ class MiningSimulator:
         self.user_profile.total_referrals += 1
         
         # Add to history
-        self.user_profile.referral_history.append({
-            "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        referral = {
+            "date": datetime.datetime.now().strftime(TIMESTAMP_FORMAT),
             "code": code,
             "points": REWARD_POINTS_PER_REFERRAL
-        })
+        }
+        self.user_profile.referral_history.append(referral)
+        self.profile_store.append_referral(referral)
         
         # Update UI
         self.update_referral_history()
-        self.save_profile()
+        self.profile_store.schedule_save()
         
         messagebox.showinfo("Success", f"Referral added! You earned {REWARD_POINTS_PER_REFERRAL} points!")
         return True
 
+def prune_depth_arg(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return value
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bitcoin Mining Simulator")
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="serve Prometheus metrics and profiler toggles on this local port"
+    )
+    parser.add_argument(
+        "--prune-depth",
+        type=prune_depth_arg,
+        default=None,
+        help="keep transactions in memory only for this many recent blocks"
+    )
+    parser.add_argument(
+        "--record",
+        metavar="FILE",
+        help="append every mined block's inputs to FILE for later replay"
+    )
+    parser.add_argument(
+        "--segment-dir",
+        default=DEFAULT_SEGMENT_DIR,
+        help="where pruned transaction bodies are stored"
+    )
+    parser.add_argument(
+        "--duty-cycle",
+        type=float,
+        default=1.0,
+        help="share of one core the mining thread may use, between 0 and 1"
+    )
+    parser.add_argument(
+        "--latency-target-ms",
+        type=float,
+        default=DEFAULT_LATENCY_TARGET * 1000,
+        help="Tk event latency the mining scheduler aims to stay under"
+    )
+    commands = parser.add_subparsers(dest="command")
+    
+    export_parser = commands.add_parser("export", help="stream a saved chain to CSV or Parquet")
+    export_parser.add_argument("--input", default="blockchain.json", help="saved blockchain file")
+    export_parser.add_argument("--output", required=True, help="file to write")
+    export_parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    export_parser.add_argument("--kind", choices=sorted(EXPORT_COLUMNS), default="blocks",
+                               help="one row per block or per parsed transaction")
+    export_parser.add_argument("--columns", help="comma separated subset of columns")
+    export_parser.add_argument("--start", type=int, help="first block height to export")
+    export_parser.add_argument("--end", type=int, help="last block height to export")
+    export_parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE,
+                               help="rows buffered per write")
+    export_parser.set_defaults(handler=run_export)
+    
+    snapshot_parser = commands.add_parser("snapshot", help="write a pruned, compacted chain snapshot")
+    snapshot_parser.add_argument("--input", default="blockchain.json", help="saved blockchain file")
+    snapshot_parser.add_argument("--output", default="blockchain.snapshot")
+    snapshot_parser.add_argument("--prune-depth", type=prune_depth_arg, default=1000,
+                                 help="newest blocks that keep their transactions inline")
+    snapshot_parser.add_argument("--segment-dir", default=DEFAULT_SEGMENT_DIR)
+    snapshot_parser.add_argument("--compression", choices=sorted(SEGMENT_COMPRESSION), default="zlib")
+    snapshot_parser.set_defaults(handler=run_snapshot)
+    
+    ingest_parser = commands.add_parser("ingest", help="pack a transaction file into pending blocks")
+    ingest_parser.add_argument("input", help="NDJSON or CSV file with sender, recipient and amount")
+    ingest_parser.add_argument("--format", choices=["ndjson", "csv"],
+                               help="input format (default: from the file extension)")
+    ingest_parser.add_argument("--output", default="pending_blocks.ndjson",
+                               help="where pending block payloads are written, one per line")
+    ingest_parser.add_argument("--block-size", type=int, default=INGEST_BLOCK_SIZE,
+                               help="maximum characters of transactions per block")
+    ingest_parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE,
+                               help="records per worker task")
+    ingest_parser.add_argument("--jobs", type=int, default=None, help="worker processes")
+    ingest_parser.add_argument("--chain", help="also mine the blocks and save the chain to this file")
+    ingest_parser.add_argument("--difficulty", type=int, default=2, help="difficulty used with --chain")
+    ingest_parser.set_defaults(handler=run_ingest)
+    
+    replay_parser = commands.add_parser("replay", help="re-run a recorded session and verify its nonces")
+    replay_parser.add_argument("recording", help="file written with --record")
+    replay_parser.set_defaults(handler=run_replay)
+    
+    sweep_parser = commands.add_parser("sweep", help="mine a grid of configurations headless")
+    sweep_parser.add_argument("--difficulty", type=int, nargs="+", default=[4])
+    sweep_parser.add_argument("--tx-size", type=int, nargs="+", default=[64],
+                              help="transaction payload size in characters")
+    sweep_parser.add_argument("--workers", type=int, nargs="+", default=[1],
+                              help="mining threads per run")
+    sweep_parser.add_argument("--blocks", type=int, nargs="+", default=[5],
+                              help="blocks mined per run")
+    sweep_parser.add_argument("--seed", type=int, nargs="+", default=[0],
+                              help="transaction generator seeds")
+    sweep_parser.add_argument("--jobs", type=int, default=None,
+                              help="worker processes (default: as many as --cpu-budget allows)")
+    sweep_parser.add_argument("--cpu-budget", type=float, default=100,
+                              help="percentage of cores to use when --jobs is not given")
+    sweep_parser.add_argument("--cpus", help="pin workers to these cores, e.g. 0-3,6")
+    sweep_parser.add_argument("--nice", type=int, default=0, help="niceness increment for workers")
+    sweep_parser.add_argument("--output", default="sweep_results.ndjson")
+    sweep_parser.set_defaults(handler=run_sweep_command)
+    
+    host_parser = commands.add_parser("host", help="mine many independent sessions in one process")
+    host_parser.add_argument("--sessions", type=int, default=100)
+    host_parser.add_argument("--difficulty", type=int, default=3)
+    host_parser.add_argument("--batch-size", type=int, default=HOST_BATCH_SIZE,
+                             help="nonces a session hashes per turn")
+    host_parser.add_argument("--processes", type=int, default=0,
+                             help="hash batches in this many worker processes (default: in the host loop)")
+    host_parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    host_parser.add_argument("--blocks", type=int, default=None, help="stop once every session has this many blocks")
+    host_parser.add_argument("--output", help="write per-session stats to this NDJSON file")
+    host_parser.set_defaults(handler=run_host)
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = MiningSimulator(root)
-    root.mainloop()
+    args = parse_args()
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port)
+    if args.command is not None:
+        args.handler(args)
+    else:
+        root = tk.Tk()
+        recorder = SessionRecorder(args.record) if args.record else None
+        scheduler = MiningScheduler(args.duty_cycle, args.latency_target_ms / 1000)
+        app = MiningSimulator(root, args.prune_depth, args.segment_dir, recorder=recorder, scheduler=scheduler)
+        root.mainloop()